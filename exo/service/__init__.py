@@ -8,6 +8,9 @@ from exo.service.backend_service import (
     ServiceManager,
     InferenceRequest,
     InferenceResponse,
+    PRIORITY_HIGH,
+    PRIORITY_MEDIUM,
+    PRIORITY_LOW,
 )
 
 __all__ = [
@@ -15,4 +18,7 @@ __all__ = [
     "ServiceManager",
     "InferenceRequest",
     "InferenceResponse",
+    "PRIORITY_HIGH",
+    "PRIORITY_MEDIUM",
+    "PRIORITY_LOW",
 ]
@@ -4,18 +4,59 @@ Handles model inference requests through a unified interface.
 """
 
 import asyncio
+import functools
 import json
 import hashlib
+import math
+import threading
+import time
 import uuid
-from typing import Dict, List, Optional, Any, Callable
-from dataclasses import dataclass, asdict
-from datetime import datetime
+from typing import Dict, List, Optional, Any, AsyncIterator, Callable, Tuple
+from dataclasses import dataclass, field
 import logging
+from collections import OrderedDict
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
+MAX_CACHE_SIZE = 1024
+MAX_CONCURRENT_REQUESTS = 200
+BATCH_SIZE = 8
+MAX_BATCH_WAIT_MS = 5
+REQUEST_TIMEOUT = 300.0
+
+# Request priorities; higher values are dispatched first
+PRIORITY_HIGH = 1000  # interactive / online traffic
+PRIORITY_MEDIUM = 100
+PRIORITY_LOW = 10  # offline batch jobs
+
+
+def _format_timestamp(ts: float) -> str:
+    """Format a Unix timestamp as a naive UTC ISO-8601 string."""
+    # Round the fraction on its own, as datetime does, rather than truncating
+    frac, whole = math.modf(ts)
+    carry, micros = divmod(round(frac * 1_000_000), 1_000_000)
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(int(whole) + carry)) + f".{micros:06d}"
+
+
+def _dumps(data: Dict) -> bytes:
+    """Serialize to UTF-8 JSON, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
 
-@dataclass
+
+@functools.lru_cache(maxsize=128)
+def _system_message(system_prompt: str) -> Dict[str, str]:
+    """Shared system message for a prompt; system prompts repeat heavily, so callers must not mutate it."""
+    return {"role": "system", "content": system_prompt}
+
+
+@dataclass(slots=True)
 class InferenceRequest:
     """Represents an inference request."""
     request_id: str
@@ -26,19 +67,48 @@ class InferenceRequest:
     top_p: float = 1.0
     top_k: int = 50
     system_prompt: Optional[str] = None
-    metadata: Dict[str, Any] = None
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    priority: int = PRIORITY_MEDIUM
+    _cache_key: Optional[bytes] = field(default=None, init=False, repr=False, compare=False)
+    _prompt_bytes: bytes = field(default=b"", init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        # Encoded once; the prompt is treated as immutable after construction
+        self._prompt_bytes = self.prompt.encode("utf-8")
     
     def to_dict(self) -> Dict:
-        """Convert to dictionary."""
-        data = asdict(self)
-        if self.metadata is None:
-            data['metadata'] = {}
-        return data
+        """
+        Convert to dictionary.
+        
+        ``metadata`` is returned by reference, not copied; callers must not
+        mutate it.
+        """
+        return {
+            "request_id": self.request_id,
+            "model_name": self.model_name,
+            "prompt": self.prompt,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "top_p": self.top_p,
+            "top_k": self.top_k,
+            "system_prompt": self.system_prompt,
+            "metadata": self.metadata or {},
+            "priority": self.priority,
+        }
+    
+    def to_json_bytes(self) -> bytes:
+        """Serialize to UTF-8 encoded JSON."""
+        return _dumps(self.to_dict())
 
 
-@dataclass
+@dataclass(slots=True)
 class InferenceResponse:
-    """Represents an inference response."""
+    """
+    Represents an inference response.
+    
+    The creation time is captured as a Unix timestamp; the ISO-8601
+    ``timestamp`` string is only formatted when the response is serialized.
+    """
     request_id: str
     status: str  # "success", "error", "processing"
     result: Optional[str] = None
@@ -46,15 +116,28 @@ class InferenceResponse:
     processing_time_ms: float = 0.0
     tokens_generated: int = 0
     model_name: Optional[str] = None
-    timestamp: str = None
-    
-    def __post_init__(self):
-        if self.timestamp is None:
-            self.timestamp = datetime.utcnow().isoformat()
+    timestamp: Optional[str] = None
+    timestamp_unix: float = field(default_factory=time.time)
     
     def to_dict(self) -> Dict:
         """Convert to dictionary."""
-        return asdict(self)
+        if self.timestamp is None:
+            self.timestamp = _format_timestamp(self.timestamp_unix)
+        return {
+            "request_id": self.request_id,
+            "status": self.status,
+            "result": self.result,
+            "error_message": self.error_message,
+            "processing_time_ms": self.processing_time_ms,
+            "tokens_generated": self.tokens_generated,
+            "model_name": self.model_name,
+            "timestamp": self.timestamp,
+            "timestamp_unix": self.timestamp_unix,
+        }
+    
+    def to_json_bytes(self) -> bytes:
+        """Serialize to UTF-8 encoded JSON."""
+        return _dumps(self.to_dict())
 
 
 class BackendService:
@@ -63,32 +146,74 @@ class BackendService:
     Abstracts the underlying inference engine and model management.
     """
     
-    def __init__(self, inference_engine=None, model_manager=None):
+    def __init__(
+        self,
+        inference_engine=None,
+        model_manager=None,
+        max_cache_size: int = MAX_CACHE_SIZE,
+        max_concurrent: int = MAX_CONCURRENT_REQUESTS,
+        batch_size: int = BATCH_SIZE,
+        max_batch_wait_ms: float = MAX_BATCH_WAIT_MS,
+        request_timeout: float = REQUEST_TIMEOUT,
+    ):
         """
         Initialize the backend service.
         
         Args:
             inference_engine: The inference engine to use
             model_manager: The model manager instance
+            max_cache_size: Maximum number of cached responses before the
+                least recently used entry is evicted
+            max_concurrent: Maximum number of concurrent calls into the
+                inference engine (a coalesced batch counts as one call)
+            batch_size: Maximum number of queued requests coalesced into a
+                single ``generate_batch`` call, if the engine provides one
+            max_batch_wait_ms: How long to wait for a batch to fill before
+                dispatching it
+            request_timeout: Seconds a caller waits for a response before
+                the request is abandoned
         """
         self.inference_engine = inference_engine
         self.model_manager = model_manager
-        self.request_queue: asyncio.Queue = asyncio.Queue()
-        self.response_cache: Dict[str, InferenceResponse] = {}
+        self._q_high: asyncio.Queue = asyncio.Queue()
+        self._q_med: asyncio.Queue = asyncio.Queue()
+        self._q_low: asyncio.Queue = asyncio.Queue()
+        self._work_available = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.max_cache_size = max_cache_size
+        # Template hasher; copying it is cheaper than constructing a new one
+        self._base_hasher = hashlib.blake2b(key=b"exo-cache", digest_size=8)
+        self.response_cache: "OrderedDict[bytes, InferenceResponse]" = OrderedDict()
         self.active_requests: Dict[str, asyncio.Task] = {}
-        self.request_handlers: List[Callable] = []
+        self._task_futures: Dict[asyncio.Task, List[asyncio.Future]] = {}
+        self._concurrency = asyncio.Semaphore(max_concurrent)
+        self.batch_size = batch_size
+        self.max_batch_wait_ms = max_batch_wait_ms
+        self.request_timeout = request_timeout
+        self.request_handlers: Dict[str, Callable] = {}
         self._running = False
     
     async def initialize(self):
         """Initialize the backend service."""
         self._running = True
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._dispatch_loop())
         logger.info("Backend service initialized")
     
     async def shutdown(self):
         """Shutdown the backend service."""
         self._running = False
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+        # Fail requests that never reached the engine
+        for queue in (self._q_high, self._q_med, self._q_low):
+            while not queue.empty():
+                _, future = queue.get_nowait()
+                if not future.done():
+                    future.set_exception(RuntimeError("Service shut down"))
         # Cancel all active requests
-        for task in self.active_requests.values():
+        for task in list(self.active_requests.values()):
             task.cancel()
         logger.info("Backend service shutdown")
     
@@ -109,27 +234,50 @@ class BackendService:
                 error_message="Service is not running"
             )
         
+        # Requests for models with a registered handler bypass the engine
+        handler = self.request_handlers.get(request.model_name)
+        if handler is not None:
+            try:
+                return await handler(request)
+            except Exception as e:
+                logger.error(f"Request handler failed: {str(e)}")
+                return InferenceResponse(
+                    request_id=request.request_id,
+                    status="error",
+                    error_message=str(e)
+                )
+        
+        future: Optional[asyncio.Future] = None
         try:
             # Check cache first
             cache_key = self._generate_cache_key(request)
-            if cache_key in self.response_cache:
-                return self.response_cache[cache_key]
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                return cached
             
-            # Create processing task
-            task = asyncio.create_task(
-                self._execute_inference(request)
-            )
-            self.active_requests[request.request_id] = task
+            # Queue for the dispatcher; cache hits never take a slot
+            future = asyncio.get_running_loop().create_future()
+            self._lane_for(request.priority).put_nowait((request, future))
+            self._work_available.set()
             
-            # Wait for completion with timeout
-            response = await asyncio.wait_for(task, timeout=300.0)
+            # Wait for completion with timeout. The future is shielded so that
+            # a timeout is handled explicitly by _abandon_request rather than
+            # by implicitly cancelling it.
+            async with asyncio.timeout(self.request_timeout):
+                response = await asyncio.shield(future)
             
-            # Cache the response
-            self.response_cache[cache_key] = response
+            # Cache only successes; a failed batch must not poison retries
+            if response.status == "success":
+                self._cache_put(cache_key, response)
             
             return response
             
-        except asyncio.TimeoutError:
+        except asyncio.CancelledError:
+            # The shield keeps cancellation from reaching the future itself
+            self._abandon_request(request, future)
+            raise
+        except TimeoutError:
+            self._abandon_request(request, future)
             return InferenceResponse(
                 request_id=request.request_id,
                 status="error",
@@ -142,9 +290,224 @@ class BackendService:
                 status="error",
                 error_message=str(e)
             )
+    
+    async def stream_inference(self, request: InferenceRequest) -> AsyncIterator[InferenceResponse]:
+        """
+        Stream an inference request as the engine produces output.
+        
+        Requires an engine with ``generate_stream``, an async iterator of
+        ``{"content": str, "tokens": int}`` chunks. Each chunk is yielded as a
+        "processing" response holding only that chunk's text; the final
+        response has status "success" (or "error"), no result text and the
+        totals for the whole generation. Streams bypass the response cache
+        and batching but hold a concurrency slot while running. Models with a
+        registered request handler are served by that handler, whose single
+        response is yielded as-is.
+        
+        Args:
+            request: The inference request
+            
+        Yields:
+            Partial inference responses followed by a final one
+        """
+        if not self._running:
+            yield InferenceResponse(
+                request_id=request.request_id,
+                status="error",
+                error_message="Service is not running"
+            )
+            return
+        
+        handler = self.request_handlers.get(request.model_name)
+        if handler is not None:
+            try:
+                yield await handler(request)
+            except Exception as e:
+                logger.error(f"Request handler failed: {str(e)}")
+                yield InferenceResponse(
+                    request_id=request.request_id,
+                    status="error",
+                    error_message=str(e)
+                )
+            return
+        
+        start_time = time.time()
+        tokens_generated = 0
+        
+        async with self._concurrency:
+            try:
+                if self.inference_engine is None:
+                    raise RuntimeError("Inference engine not configured")
+                if not hasattr(self.inference_engine, "generate_stream"):
+                    raise RuntimeError("Inference engine does not support streaming")
+                
+                async for chunk in self.inference_engine.generate_stream(
+                    model=request.model_name,
+                    messages=self._build_messages(request),
+                    temperature=request.temperature,
+                    max_tokens=request.max_tokens,
+                    top_p=request.top_p,
+                    top_k=request.top_k,
+                ):
+                    tokens = chunk.get("tokens", 0)
+                    tokens_generated += tokens
+                    yield InferenceResponse(
+                        request_id=request.request_id,
+                        status="processing",
+                        result=chunk.get("content", ""),
+                        model_name=request.model_name,
+                        processing_time_ms=(time.time() - start_time) * 1000,
+                        tokens_generated=tokens,
+                    )
+                
+            except Exception as e:
+                logger.error(f"Streaming inference failed: {str(e)}")
+                yield InferenceResponse(
+                    request_id=request.request_id,
+                    status="error",
+                    error_message=str(e),
+                    model_name=request.model_name,
+                    processing_time_ms=(time.time() - start_time) * 1000,
+                    tokens_generated=tokens_generated,
+                )
+                return
+        
+        yield InferenceResponse(
+            request_id=request.request_id,
+            status="success",
+            model_name=request.model_name,
+            processing_time_ms=(time.time() - start_time) * 1000,
+            tokens_generated=tokens_generated,
+        )
+    
+    def _abandon_request(self, request: InferenceRequest, future: Optional[asyncio.Future]):
+        """Stop work for a request whose caller has given up on it."""
+        if future is None:
+            return
+        if not future.done():
+            # Lets the dispatcher skip it if it is still queued
+            future.cancel()
+        task = self.active_requests.get(request.request_id)
+        # Don't cancel a batch that other callers are still waiting on
+        if task is not None and all(f.done() for f in self._task_futures.get(task, ())):
+            task.cancel()
+    
+    async def _notify_engine_cancelled(self, requests: List[InferenceRequest]):
+        """Let engines that support it release state held for cancelled requests."""
+        cancel = getattr(self.inference_engine, "cancel", None)
+        if cancel is None:
+            return
+        for request in requests:
+            try:
+                await cancel(request.request_id)
+            except Exception as e:
+                logger.error(f"Engine cancellation failed: {str(e)}")
+    
+    def _lane_for(self, priority: int) -> asyncio.Queue:
+        """Select the dispatch queue for a request priority."""
+        if priority >= PRIORITY_HIGH:
+            return self._q_high
+        if priority >= PRIORITY_MEDIUM:
+            return self._q_med
+        return self._q_low
+    
+    def _pop_queued(self):
+        """Pop the next live request without waiting, draining higher lanes first."""
+        for queue in (self._q_high, self._q_med, self._q_low):
+            while not queue.empty():
+                item = queue.get_nowait()
+                # Skip requests whose caller timed out while still queued
+                if not item[1].done():
+                    return item
+        return None
+    
+    async def _collect_batch(self) -> List[tuple]:
+        """
+        Wait for queued work and coalesce it into a batch.
+        
+        Returns as soon as ``batch_size`` requests are collected or
+        ``max_batch_wait_ms`` has elapsed since the first one. Engines
+        without ``generate_batch`` always get single-request batches.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            item = self._pop_queued()
+            if item is not None:
+                break
+            self._work_available.clear()
+            await self._work_available.wait()
+        
+        batch = [item]
+        if self.batch_size <= 1 or not hasattr(self.inference_engine, "generate_batch"):
+            return batch
+        
+        deadline = loop.time() + self.max_batch_wait_ms / 1000
+        try:
+            while len(batch) < self.batch_size:
+                item = self._pop_queued()
+                if item is not None:
+                    batch.append(item)
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                self._work_available.clear()
+                try:
+                    async with asyncio.timeout(remaining):
+                        await self._work_available.wait()
+                except TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            # Shutdown while filling: these requests are no longer queued
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("Service shut down"))
+            raise
+        return batch
+    
+    async def _dispatch_loop(self):
+        """Hand queued requests to the engine as concurrency slots free up."""
+        while True:
+            await self._concurrency.acquire()
+            try:
+                batch = await self._collect_batch()
+            except asyncio.CancelledError:
+                self._concurrency.release()
+                raise
+            task = asyncio.create_task(self._run_dispatched(batch))
+            self._task_futures[task] = [future for _, future in batch]
+            for request, _ in batch:
+                self.active_requests[request.request_id] = task
+    
+    async def _run_dispatched(self, batch: List[tuple]):
+        """Execute a dispatched batch and resolve each caller's future."""
+        requests = [request for request, _ in batch]
+        try:
+            if len(requests) == 1:
+                responses = [await self._execute_inference(requests[0])]
+            else:
+                responses = await self._execute_batch_inference(requests)
+        except asyncio.CancelledError:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("Request cancelled"))
+            await self._notify_engine_cancelled(requests)
+            raise
         finally:
-            # Clean up
-            self.active_requests.pop(request.request_id, None)
+            self._concurrency.release()
+            self._task_futures.pop(asyncio.current_task(), None)
+            for request in requests:
+                self.active_requests.pop(request.request_id, None)
+        for (_, future), response in zip(batch, responses):
+            if not future.done():
+                future.set_result(response)
+    
+    def _build_messages(self, request: InferenceRequest) -> Tuple[Dict[str, str], ...]:
+        """Build the chat messages sent to the inference engine."""
+        user_message = {"role": "user", "content": request.prompt}
+        if request.system_prompt:
+            return (_system_message(request.system_prompt), user_message)
+        return (user_message,)
     
     async def _execute_inference(self, request: InferenceRequest) -> InferenceResponse:
         """
@@ -156,7 +519,6 @@ class BackendService:
         Returns:
             The inference response
         """
-        import time
         start_time = time.time()
         
         try:
@@ -164,22 +526,10 @@ class BackendService:
             if self.inference_engine is None:
                 raise RuntimeError("Inference engine not configured")
             
-            # Prepare the input
-            messages = []
-            if request.system_prompt:
-                messages.append({
-                    "role": "system",
-                    "content": request.system_prompt
-                })
-            messages.append({
-                "role": "user",
-                "content": request.prompt
-            })
-            
             # Execute inference
             result = await self.inference_engine.generate(
                 model=request.model_name,
-                messages=messages,
+                messages=self._build_messages(request),
                 temperature=request.temperature,
                 max_tokens=request.max_tokens,
                 top_p=request.top_p,
@@ -206,27 +556,109 @@ class BackendService:
                 processing_time_ms=(time.time() - start_time) * 1000,
             )
     
-    def _generate_cache_key(self, request: InferenceRequest) -> str:
+    async def _execute_batch_inference(self, requests: List[InferenceRequest]) -> List[InferenceResponse]:
+        """
+        Execute several requests in a single engine call.
+        
+        Args:
+            requests: The inference requests
+            
+        Returns:
+            One inference response per request, in order
+        """
+        start_time = time.time()
+        
+        try:
+            results = await self.inference_engine.generate_batch(
+                [self._build_messages(request) for request in requests],
+                [{
+                    "model": request.model_name,
+                    "temperature": request.temperature,
+                    "max_tokens": request.max_tokens,
+                    "top_p": request.top_p,
+                    "top_k": request.top_k,
+                } for request in requests],
+            )
+            if len(results) != len(requests):
+                raise RuntimeError(f"Engine returned {len(results)} results for a batch of {len(requests)} requests")
+            
+            processing_time = (time.time() - start_time) * 1000
+            
+            return [
+                InferenceResponse(
+                    request_id=request.request_id,
+                    status="success",
+                    result=result.get("content", ""),
+                    model_name=request.model_name,
+                    processing_time_ms=processing_time,
+                    tokens_generated=result.get("tokens", 0),
+                ) for request, result in zip(requests, results)
+            ]
+            
+        except Exception as e:
+            logger.error(f"Batch inference execution failed: {str(e)}")
+            processing_time = (time.time() - start_time) * 1000
+            return [
+                InferenceResponse(
+                    request_id=request.request_id,
+                    status="error",
+                    error_message=str(e),
+                    processing_time_ms=processing_time,
+                ) for request in requests
+            ]
+    
+    def _generate_cache_key(self, request: InferenceRequest) -> bytes:
         """
         Generate a cache key for a request.
         
+        The key only needs to be collision-resistant within a single process,
+        so a 64-bit BLAKE2b digest is used instead of a hex-encoded SHA-256.
+        The digest is memoized on the request, so a request must not be
+        mutated after it has been submitted.
+        
         Args:
             request: The inference request
             
         Returns:
-            A cache key string
+            An 8-byte cache key
         """
-        key_data = f"{request.model_name}:{request.prompt}:{request.temperature}:{request.top_p}"
-        return hashlib.sha256(key_data.encode()).hexdigest()
+        if request._cache_key is not None:
+            return request._cache_key
+        h = self._base_hasher.copy()
+        h.update(request.model_name.encode())
+        h.update(b"\0")
+        h.update(request._prompt_bytes)
+        h.update(b"\0")
+        h.update(repr(request.temperature).encode())
+        h.update(b"\0")
+        h.update(repr(request.top_p).encode())
+        request._cache_key = h.digest()
+        return request._cache_key
+    
+    def _cache_get(self, key: bytes) -> Optional[InferenceResponse]:
+        """Look up a cached response, marking it as most recently used."""
+        response = self.response_cache.get(key)
+        if response is not None:
+            self.response_cache.move_to_end(key)
+        return response
+    
+    def _cache_put(self, key: bytes, response: InferenceResponse):
+        """Cache a response, evicting the least recently used entries if full."""
+        self.response_cache[key] = response
+        self.response_cache.move_to_end(key)
+        while len(self.response_cache) > self.max_cache_size:
+            self.response_cache.popitem(last=False)
     
-    def register_request_handler(self, handler: Callable):
+    def register_request_handler(self, key: str, handler: Callable):
         """
         Register a custom request handler.
         
         Args:
-            handler: A callable that processes requests
+            key: The model name whose requests the handler processes
+            handler: An async callable taking an InferenceRequest and
+                returning an InferenceResponse
         """
-        self.request_handlers.append(handler)
+        self.request_handlers[key] = handler
     
     async def process_batch(self, requests: List[InferenceRequest]) -> List[InferenceResponse]:
         """
@@ -253,9 +685,10 @@ class BackendService:
         return {
             "running": self._running,
             "active_requests": len(self.active_requests),
+            "queued_requests": self._q_high.qsize() + self._q_med.qsize() + self._q_low.qsize(),
             "cached_responses": len(self.response_cache),
             "registered_handlers": len(self.request_handlers),
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": _format_timestamp(time.time()),
         }
 
 
@@ -263,13 +696,18 @@ class ServiceManager:
     """Manages backend service lifecycle and configuration."""
     
     _instance: Optional[BackendService] = None
+    _lock = threading.Lock()
     
     @classmethod
     def get_service(cls) -> BackendService:
         """Get or create the backend service instance."""
-        if cls._instance is None:
-            cls._instance = BackendService()
-        return cls._instance
+        instance = cls._instance
+        if instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = BackendService()
+                instance = cls._instance
+        return instance
     
     @classmethod
     async def initialize_service(cls, inference_engine=None, model_manager=None):
@@ -283,6 +721,7 @@ class ServiceManager:
     @classmethod
     async def shutdown_service(cls):
         """Shutdown the backend service."""
-        if cls._instance is not None:
-            await cls._instance.shutdown()
-            cls._instance = None
+        with cls._lock:
+            instance, cls._instance = cls._instance, None
+        if instance is not None:
+            await instance.shutdown()
@@ -0,0 +1,524 @@
+import asyncio
+import json
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from exo.service import backend_service
+from exo.service.backend_service import BackendService, ServiceManager, InferenceRequest, InferenceResponse, PRIORITY_HIGH, PRIORITY_LOW
+
+
+class FakeInferenceEngine:
+    def __init__(self):
+        self.calls = 0
+
+    async def generate(self, model, messages, **kwargs):
+        self.calls += 1
+        return {"content": messages[-1]["content"].upper(), "tokens": 3}
+
+
+def make_request(request_id="req-1", prompt="hello", **kwargs) -> InferenceRequest:
+    return InferenceRequest(request_id=request_id, model_name="test-model", prompt=prompt, **kwargs)
+
+
+def test_cache_key_is_compact_and_stable():
+    service = BackendService()
+    key = service._generate_cache_key(make_request())
+
+    assert isinstance(key, bytes)
+    assert len(key) == 8
+    assert key == service._generate_cache_key(make_request(request_id="req-2"))
+
+
+def test_cache_key_separates_fields():
+    service = BackendService()
+    a = InferenceRequest(request_id="a", model_name="ab", prompt="c")
+    b = InferenceRequest(request_id="b", model_name="a", prompt="bc")
+
+    assert service._generate_cache_key(a) != service._generate_cache_key(b)
+    assert service._generate_cache_key(make_request(temperature=0.1)) != service._generate_cache_key(make_request(temperature=0.2))
+
+
+@pytest.mark.asyncio
+async def test_process_request_uses_cache():
+    engine = FakeInferenceEngine()
+    service = BackendService(inference_engine=engine)
+    await service.initialize()
+
+    first = await service.process_request(make_request())
+    second = await service.process_request(make_request(request_id="req-2"))
+
+    assert first.status == "success"
+    assert first.result == "HELLO"
+    assert second is first
+    assert engine.calls == 1
+    await service.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_process_request_when_not_running():
+    service = BackendService(inference_engine=FakeInferenceEngine())
+
+    response = await service.process_request(make_request())
+
+    assert response.status == "error"
+    assert response.error_message == "Service is not running"
+
+
+def test_cache_key_is_memoized_on_request():
+    service = BackendService()
+    request = make_request()
+
+    key = service._generate_cache_key(request)
+
+    assert request._cache_key == key
+    assert request._prompt_bytes == b"hello"
+    assert service._generate_cache_key(request) is key
+    assert "_cache_key" not in request.to_dict()
+
+
+@pytest.mark.asyncio
+async def test_response_cache_evicts_least_recently_used():
+    engine = FakeInferenceEngine()
+    service = BackendService(inference_engine=engine, max_cache_size=2)
+    await service.initialize()
+
+    await service.process_request(make_request("r1", prompt="a"))
+    await service.process_request(make_request("r2", prompt="b"))
+    await service.process_request(make_request("r3", prompt="a"))
+    await service.process_request(make_request("r4", prompt="c"))
+
+    assert len(service.response_cache) == 2
+    assert engine.calls == 3
+
+    await service.process_request(make_request("r5", prompt="a"))
+    assert engine.calls == 3
+    await service.process_request(make_request("r6", prompt="b"))
+    assert engine.calls == 4
+    await service.shutdown()
+
+
+def test_response_timestamp_is_formatted_on_serialization():
+    response = InferenceResponse(request_id="r1", status="success", timestamp_unix=1700000000.25)
+
+    assert response.timestamp is None
+    data = response.to_dict()
+    assert data["timestamp"] == "2023-11-14T22:13:20.250000"
+    assert data["timestamp_unix"] == 1700000000.25
+    assert response.timestamp == data["timestamp"]
+
+
+@pytest.mark.parametrize("ts", [1700000000.000001, 1700000000.9999996, 1700000000.123456, 1699999999.5])
+def test_format_timestamp_matches_datetime(ts):
+    from datetime import datetime, timezone
+
+    expected = datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None).isoformat(timespec="microseconds")
+    assert backend_service._format_timestamp(ts) == expected
+
+
+def test_dataclasses_use_slots():
+    request = make_request()
+    response = InferenceResponse(request_id="r1", status="success")
+
+    assert not hasattr(request, "__dict__")
+    assert not hasattr(response, "__dict__")
+    assert request.metadata == {}
+    assert make_request().metadata is not request.metadata
+
+
+def test_to_dict_matches_dataclass_fields():
+    from dataclasses import asdict
+
+    request = make_request(metadata={"tenant": "a"})
+    expected = asdict(request)
+    expected.pop("_cache_key")
+    expected.pop("_prompt_bytes")
+    assert request.to_dict() == expected
+
+    response = InferenceResponse(request_id="r1", status="success", result="ok")
+    assert response.to_dict() == asdict(response)
+
+
+@pytest.mark.asyncio
+async def test_process_batch_limits_concurrency():
+    class SlowEngine(FakeInferenceEngine):
+        def __init__(self):
+            super().__init__()
+            self.in_flight = 0
+            self.peak = 0
+
+        async def generate(self, model, messages, **kwargs):
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            await asyncio.sleep(0.01)
+            self.in_flight -= 1
+            return await super().generate(model, messages, **kwargs)
+
+    engine = SlowEngine()
+    service = BackendService(inference_engine=engine, max_concurrent=3)
+    await service.initialize()
+
+    responses = await service.process_batch([make_request(f"r{i}", prompt=str(i)) for i in range(10)])
+
+    assert [r.status for r in responses] == ["success"] * 10
+    assert engine.peak == 3
+    await service.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_high_priority_requests_skip_ahead_of_batch_lane():
+    order = []
+    release = asyncio.Event()
+
+    class RecordingEngine(FakeInferenceEngine):
+        async def generate(self, model, messages, **kwargs):
+            order.append(messages[-1]["content"])
+            await release.wait()
+            return await super().generate(model, messages, **kwargs)
+
+    service = BackendService(inference_engine=RecordingEngine(), max_concurrent=1)
+    await service.initialize()
+
+    blocker = asyncio.create_task(service.process_request(make_request("r0", prompt="blocker")))
+    await asyncio.sleep(0)
+    batch = [asyncio.create_task(service.process_request(make_request(f"b{i}", prompt=f"batch{i}", priority=PRIORITY_LOW))) for i in range(3)]
+    online = asyncio.create_task(service.process_request(make_request("o1", prompt="online", priority=PRIORITY_HIGH)))
+    await asyncio.sleep(0.01)
+    release.set()
+    await asyncio.gather(blocker, online, *batch)
+
+    assert order == ["blocker", "online", "batch0", "batch1", "batch2"]
+    await service.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_shutdown_fails_queued_requests():
+    release = asyncio.Event()
+
+    class BlockingEngine(FakeInferenceEngine):
+        async def generate(self, model, messages, **kwargs):
+            await release.wait()
+            return await super().generate(model, messages, **kwargs)
+
+    service = BackendService(inference_engine=BlockingEngine(), max_concurrent=1)
+    await service.initialize()
+
+    running = asyncio.create_task(service.process_request(make_request("r1", prompt="a")))
+    queued = asyncio.create_task(service.process_request(make_request("r2", prompt="b")))
+    await asyncio.sleep(0.01)
+    assert service.get_service_status()["queued_requests"] == 1
+
+    await service.shutdown()
+    responses = await asyncio.gather(running, queued)
+
+    assert [r.status for r in responses] == ["error", "error"]
+    assert responses[1].error_message == "Service shut down"
+
+
+@pytest.mark.asyncio
+async def test_queued_requests_are_coalesced_into_batches():
+    class BatchingEngine(FakeInferenceEngine):
+        def __init__(self):
+            super().__init__()
+            self.batch_sizes = []
+
+        async def generate_batch(self, messages_list, params_list):
+            self.batch_sizes.append(len(messages_list))
+            return [{"content": messages[-1]["content"].upper(), "tokens": 1} for messages in messages_list]
+
+    engine = BatchingEngine()
+    service = BackendService(inference_engine=engine, batch_size=4, max_batch_wait_ms=20)
+    await service.initialize()
+
+    responses = await service.process_batch([make_request(f"r{i}", prompt=f"p{i}") for i in range(6)])
+
+    assert [r.result for r in responses] == [f"P{i}" for i in range(6)]
+    assert engine.batch_sizes == [4, 2]
+    assert engine.calls == 0
+    assert service.active_requests == {}
+    await service.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_service_manager_creates_single_instance_across_threads():
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        services = list(executor.map(lambda _: ServiceManager.get_service(), range(32)))
+
+    assert all(service is services[0] for service in services)
+
+    await ServiceManager.shutdown_service()
+    assert ServiceManager.get_service() is not services[0]
+    await ServiceManager.shutdown_service()
+
+
+def test_build_messages_shares_system_message():
+    service = BackendService()
+
+    first = service._build_messages(make_request(system_prompt="be brief"))
+    second = service._build_messages(make_request(prompt="other", system_prompt="be brief"))
+
+    assert first == ({"role": "system", "content": "be brief"}, {"role": "user", "content": "hello"})
+    assert first[0] is second[0]
+    assert service._build_messages(make_request()) == ({"role": "user", "content": "hello"},)
+
+
+@pytest.mark.asyncio
+async def test_timeout_cancels_engine_work_and_notifies_engine():
+    started = asyncio.Event()
+
+    class HangingEngine(FakeInferenceEngine):
+        def __init__(self):
+            super().__init__()
+            self.cancelled = []
+
+        async def generate(self, model, messages, **kwargs):
+            started.set()
+            await asyncio.sleep(10)
+
+        async def cancel(self, request_id):
+            self.cancelled.append(request_id)
+
+    engine = HangingEngine()
+    service = BackendService(inference_engine=engine, max_concurrent=1, request_timeout=0.05)
+    await service.initialize()
+
+    running = asyncio.create_task(service.process_request(make_request("r1", prompt="a")))
+    await started.wait()
+    queued = await service.process_request(make_request("r2", prompt="b"))
+    response = await running
+
+    assert response.error_message == "Request timeout"
+    assert queued.error_message == "Request timeout"
+    await asyncio.sleep(0.01)
+    assert engine.cancelled == ["r1"]
+    assert service.active_requests == {}
+    assert service.get_service_status()["queued_requests"] == 0
+    await service.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_stream_inference_yields_chunks_then_final_response():
+    class StreamingEngine(FakeInferenceEngine):
+        async def generate_stream(self, model, messages, **kwargs):
+            for word in ("Hel", "lo", "!"):
+                yield {"content": word, "tokens": 1}
+
+    service = BackendService(inference_engine=StreamingEngine())
+    await service.initialize()
+
+    responses = [response async for response in service.stream_inference(make_request())]
+
+    assert [r.status for r in responses] == ["processing"] * 3 + ["success"]
+    assert "".join(r.result for r in responses[:-1]) == "Hello!"
+    assert responses[-1].result is None
+    assert responses[-1].tokens_generated == 3
+    await service.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_stream_inference_requires_streaming_engine():
+    service = BackendService(inference_engine=FakeInferenceEngine())
+    await service.initialize()
+
+    responses = [response async for response in service.stream_inference(make_request())]
+
+    assert len(responses) == 1
+    assert responses[0].status == "error"
+    assert "streaming" in responses[0].error_message
+    await service.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_registered_handler_serves_its_model():
+    engine = FakeInferenceEngine()
+    service = BackendService(inference_engine=engine)
+    await service.initialize()
+
+    async def handler(request):
+        return InferenceResponse(request_id=request.request_id, status="success", result="handled")
+
+    service.register_request_handler("test-model", handler)
+    handled = await service.process_request(make_request())
+    other = await service.process_request(InferenceRequest(request_id="r2", model_name="other", prompt="hello"))
+
+    assert handled.result == "handled"
+    assert other.result == "HELLO"
+    assert engine.calls == 1
+    assert service.get_service_status()["registered_handlers"] == 1
+    await service.shutdown()
+
+
+@pytest.mark.parametrize("use_orjson", [False, True])
+def test_to_json_bytes_round_trips(use_orjson, monkeypatch):
+    if use_orjson:
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(backend_service, "orjson", None)
+    request = make_request(prompt="héllo", metadata={"tenant": "a", 1: "x"})
+    response = InferenceResponse(request_id="r1", status="success", result="ok")
+
+    assert json.loads(request.to_json_bytes()) == {**request.to_dict(), "metadata": {"tenant": "a", "1": "x"}}
+    assert json.loads(response.to_json_bytes()) == response.to_dict()
+
+
+def test_json_backends_produce_identical_bytes(monkeypatch):
+    pytest.importorskip("orjson")
+    data = {"prompt": "héllo", "metadata": {1: "x", "k": [1, 2.5, None, True]}}
+
+    fast = backend_service._dumps(data)
+    monkeypatch.setattr(backend_service, "orjson", None)
+
+    assert backend_service._dumps(data) == fast
+
+
+@pytest.mark.asyncio
+async def test_shutdown_fails_partially_collected_batch():
+    class BatchingEngine(FakeInferenceEngine):
+        async def generate_batch(self, messages_list, params_list):
+            return [{"content": "unused", "tokens": 1} for _ in messages_list]
+
+    service = BackendService(inference_engine=BatchingEngine(), batch_size=4, max_batch_wait_ms=200, request_timeout=1.0)
+    await service.initialize()
+
+    pending = asyncio.create_task(service.process_request(make_request()))
+    await asyncio.sleep(0.02)
+    await service.shutdown()
+    response = await asyncio.wait_for(pending, timeout=0.5)
+
+    assert response.status == "error"
+    assert response.error_message == "Service shut down"
+
+
+@pytest.mark.asyncio
+async def test_short_batch_result_fails_whole_batch():
+    class ShortBatchEngine(FakeInferenceEngine):
+        async def generate_batch(self, messages_list, params_list):
+            return [{"content": "only one", "tokens": 1}]
+
+    service = BackendService(inference_engine=ShortBatchEngine(), batch_size=3, max_batch_wait_ms=20, request_timeout=1.0)
+    await service.initialize()
+
+    responses = await service.process_batch([make_request(f"r{i}", prompt=f"p{i}") for i in range(3)])
+
+    assert [r.status for r in responses] == ["error"] * 3
+    assert "1 results for a batch of 3" in responses[0].error_message
+    await service.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_abandons_queued_request():
+    release = asyncio.Event()
+    seen = []
+
+    class BlockingEngine(FakeInferenceEngine):
+        async def generate(self, model, messages, **kwargs):
+            seen.append(messages[-1]["content"])
+            await release.wait()
+            return await super().generate(model, messages, **kwargs)
+
+    service = BackendService(inference_engine=BlockingEngine(), max_concurrent=1)
+    await service.initialize()
+
+    first = asyncio.create_task(service.process_request(make_request("r1", prompt="p1")))
+    second = asyncio.create_task(service.process_request(make_request("r2", prompt="p2")))
+    await asyncio.sleep(0.01)
+    second.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await second
+    release.set()
+    await first
+    await asyncio.sleep(0.01)
+
+    assert seen == ["p1"]
+    assert service.active_requests == {}
+    await service.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_timeout_cancels_batch_once_every_caller_gave_up():
+    class HangingBatchEngine(FakeInferenceEngine):
+        def __init__(self):
+            super().__init__()
+            self.finished = False
+            self.cancelled = []
+
+        async def generate_batch(self, messages_list, params_list):
+            await asyncio.sleep(10)
+            self.finished = True
+
+        async def cancel(self, request_id):
+            self.cancelled.append(request_id)
+
+    engine = HangingBatchEngine()
+    service = BackendService(inference_engine=engine, batch_size=3, max_batch_wait_ms=20, request_timeout=0.1)
+    await service.initialize()
+
+    responses = await service.process_batch([make_request(f"r{i}", prompt=f"p{i}") for i in range(3)])
+    await asyncio.sleep(0.01)
+
+    assert [r.error_message for r in responses] == ["Request timeout"] * 3
+    assert not engine.finished
+    assert sorted(engine.cancelled) == ["r0", "r1", "r2"]
+    assert service.active_requests == {}
+    assert service._task_futures == {}
+    await service.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_failing_handler_returns_error_response():
+    service = BackendService(inference_engine=FakeInferenceEngine())
+    await service.initialize()
+
+    async def handler(request):
+        raise TimeoutError("upstream timed out")
+
+    service.register_request_handler("test-model", handler)
+    response = await service.process_request(make_request())
+
+    assert response.status == "error"
+    assert response.error_message == "upstream timed out"
+    await service.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_stream_inference_uses_registered_handler():
+    class StreamingEngine(FakeInferenceEngine):
+        async def generate_stream(self, model, messages, **kwargs):
+            yield {"content": "engine", "tokens": 1}
+
+    service = BackendService(inference_engine=StreamingEngine())
+    await service.initialize()
+
+    async def handler(request):
+        return InferenceResponse(request_id=request.request_id, status="success", result="handled")
+
+    service.register_request_handler("test-model", handler)
+    responses = [response async for response in service.stream_inference(make_request())]
+
+    assert [(r.status, r.result) for r in responses] == [("success", "handled")]
+    await service.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_responses_are_not_cached():
+    class FlakyBatchEngine(FakeInferenceEngine):
+        def __init__(self):
+            super().__init__()
+            self.batch_calls = 0
+
+        async def generate_batch(self, messages_list, params_list):
+            self.batch_calls += 1
+            if self.batch_calls == 1:
+                raise RuntimeError("transient failure")
+            return [{"content": messages[-1]["content"].upper(), "tokens": 1} for messages in messages_list]
+
+    engine = FlakyBatchEngine()
+    service = BackendService(inference_engine=engine, batch_size=2, max_batch_wait_ms=20)
+    await service.initialize()
+
+    failed = await service.process_batch([make_request("r1", prompt="a"), make_request("r2", prompt="b")])
+    retried = await service.process_batch([make_request("r3", prompt="a"), make_request("r4", prompt="b")])
+
+    assert [r.status for r in failed] == ["error", "error"]
+    assert [r.result for r in retried] == ["A", "B"]
+    assert engine.batch_calls == 2
+    assert len(service.response_cache) == 2
+    await service.shutdown()
@@ -0,0 +1,166 @@
+import json
+import asyncio
+import subprocess
+import threading
+import pytest
+from unittest.mock import patch
+from exo.windows_config import WindowsSystemConfig, _sysinfo_cache_path
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOCALAPPDATA", str(tmp_path))
+
+
+def completed(stdout="", returncode=0):
+    return subprocess.CompletedProcess(args=[], returncode=returncode, stdout=stdout, stderr="")
+
+
+def fake_run(outputs):
+    def run(cmd, **kwargs):
+        output = outputs.get(cmd[0])
+        if output is None:
+            raise FileNotFoundError(cmd[0])
+        return output
+    return run
+
+
+def test_detect_gpus_collects_all_vendors():
+    outputs = {
+        "nvidia-smi": completed("NVIDIA GeForce RTX 4090, 24564 MiB\nNVIDIA GeForce RTX 3060, 12288 MiB\n"),
+        "amd-smi": completed("gpu,bdf\n0,0000:03:00.0\n"),
+        "powershell": completed("Name\n----\nIntel(R) Arc(TM) A770 Graphics\n"),
+    }
+    with patch("subprocess.run", side_effect=fake_run(outputs)):
+        config = WindowsSystemConfig()
+
+    assert config.gpu_info == [
+        {"type": "NVIDIA", "name": "NVIDIA GeForce RTX 4090", "memory_mb": 24564},
+        {"type": "NVIDIA", "name": "NVIDIA GeForce RTX 3060", "memory_mb": 12288},
+        {"type": "AMD", "name": "AMD GPU", "memory_mb": 0},
+        {"type": "Intel Arc", "name": "Intel Arc GPU", "memory_mb": 0},
+    ]
+
+
+def test_detect_gpus_without_tools():
+    with patch("subprocess.run", side_effect=fake_run({})):
+        config = WindowsSystemConfig()
+
+    assert config.gpu_info == []
+
+
+def test_detect_gpus_runs_probes_concurrently():
+    barrier = threading.Barrier(3, timeout=2)
+
+    def run(cmd, **kwargs):
+        barrier.wait()
+        return completed(returncode=1)
+
+    with patch("subprocess.run", side_effect=run):
+        config = WindowsSystemConfig()
+
+    assert config.gpu_info == []
+    assert not barrier.broken
+
+
+def test_system_info_is_cached_to_disk():
+    outputs = {"nvidia-smi": completed("NVIDIA GeForce RTX 4090, 24564 MiB\n")}
+    with patch("subprocess.run", side_effect=fake_run(outputs)) as run:
+        first = WindowsSystemConfig()
+        assert _sysinfo_cache_path().exists()
+        calls = run.call_count
+        second = WindowsSystemConfig()
+
+    assert run.call_count == calls
+    assert second.gpu_info == first.gpu_info
+    assert second.system_info["cpu_count_logical"] == first.system_info["cpu_count_logical"]
+
+
+def test_stale_or_foreign_cache_is_ignored():
+    with patch("subprocess.run", side_effect=fake_run({})):
+        WindowsSystemConfig()
+    path = _sysinfo_cache_path()
+
+    for change in ({"version": "other"}, {"created_at": 0}, {"created_at": 4102444800}, {"node": "other-host"}, {"platform": "other-os"}):
+        data = json.loads(path.read_text())
+        data.update(change)
+        data["gpu_info"] = [{"type": "stale", "name": "stale", "memory_mb": 0}]
+        path.write_text(json.dumps(data))
+        with patch("subprocess.run", side_effect=fake_run({})):
+            assert WindowsSystemConfig().gpu_info == []
+
+
+def test_get_cpu_info_does_not_block():
+    with patch("subprocess.run", side_effect=fake_run({})):
+        config = WindowsSystemConfig()
+
+    with patch("psutil.cpu_percent", return_value=12.5) as cpu_percent:
+        info = config.get_cpu_info()
+
+    cpu_percent.assert_called_once_with(interval=None)
+    assert info["usage_percent"] == 12.5
+
+
+@pytest.mark.asyncio
+async def test_cpu_sampler_refreshes_cached_usage():
+    with patch("subprocess.run", side_effect=fake_run({})):
+        config = WindowsSystemConfig()
+
+    with patch("psutil.cpu_percent", return_value=42.0):
+        task = config.start_cpu_sampler(interval=0.01)
+        await asyncio.sleep(0.05)
+    assert config.start_cpu_sampler() is task
+
+    with patch("psutil.cpu_percent") as cpu_percent:
+        assert config.get_cpu_info()["usage_percent"] == 42.0
+    cpu_percent.assert_not_called()
+
+    config.stop_cpu_sampler()
+    await asyncio.sleep(0)
+    assert task.cancelled()
+    with patch("psutil.cpu_percent", return_value=7.0):
+        assert config.get_cpu_info()["usage_percent"] == 7.0
+
+
+def test_nvidia_output_parsing_handles_missing_memory():
+    outputs = {"nvidia-smi": completed("NVIDIA A100-SXM4-80GB, 81920 MiB\r\n\r\n   \r\nNVIDIA T4, [N/A]\r\n \t\nNVIDIA L4\r\n")}
+    with patch("subprocess.run", side_effect=fake_run(outputs)):
+        config = WindowsSystemConfig(use_cache=False)
+
+    assert config.gpu_info == [
+        {"type": "NVIDIA", "name": "NVIDIA A100-SXM4-80GB", "memory_mb": 81920},
+        {"type": "NVIDIA", "name": "NVIDIA T4", "memory_mb": 0},
+        {"type": "NVIDIA", "name": "NVIDIA L4", "memory_mb": 0},
+    ]
+
+
+def test_intel_arc_detection_ignores_other_words():
+    outputs = {"powershell": completed("Name\n----\nSearchLight Display Adapter\n")}
+    with patch("subprocess.run", side_effect=fake_run(outputs)):
+        config = WindowsSystemConfig(use_cache=False)
+
+    assert config.gpu_info == []
+
+
+def test_system_info_queries_memory_once():
+    import psutil
+
+    with patch("subprocess.run", side_effect=fake_run({})), patch("psutil.virtual_memory", wraps=psutil.virtual_memory) as virtual_memory:
+        config = WindowsSystemConfig(use_cache=False)
+
+    assert virtual_memory.call_count == 1
+    assert config.system_info["available_memory_gb"] <= config.system_info["total_memory_gb"]
+
+    with patch("psutil.cpu_count") as cpu_count:
+        info = config.get_cpu_info()
+    cpu_count.assert_not_called()
+    assert info["logical_cores"] == config.system_info["cpu_count_logical"]
+
+
+
+def test_empty_localappdata_falls_back_to_home(monkeypatch):
+    from pathlib import Path
+
+    monkeypatch.setenv("LOCALAPPDATA", "")
+
+    assert _sysinfo_cache_path() == Path.home()/".cache"/"exo"/"sysinfo.json"
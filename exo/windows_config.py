@@ -5,37 +5,121 @@ Handles Windows-specific system optimizations and device detection.
 
 import os
 import sys
+import re
+import json
+import asyncio
+import functools
+import time
 import platform
 import subprocess
 import psutil
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional, Tuple
+from exo.helpers import VERSION
+
+# Hardware rarely changes, so detected system facts are reused for an hour
+SYSINFO_CACHE_TTL = 3600
+CPU_SAMPLE_INTERVAL = 5.0
+
+# "name, memory MiB" rows from nvidia-smi's csv,noheader output
+_NVIDIA_LINE = re.compile(r"^[ \t]*([^,\s][^,\r\n]*?)[ \t]*(?:,[ \t]*(\d+)?[^\r\n]*)?\r?$", re.MULTILINE)
+# Matches "Intel(R) Arc(TM) A770" but not words such as "Search" or "Archive"
+_INTEL_ARC = re.compile(r"\bArc\b")
+
+
+@functools.lru_cache(maxsize=1)
+def _cpu_counts() -> Tuple[Optional[int], Optional[int]]:
+    """Physical and logical CPU counts; fixed for the life of the process."""
+    return psutil.cpu_count(logical=False), psutil.cpu_count(logical=True)
+
+
+def _sysinfo_cache_path() -> Path:
+    """Location of the on-disk system information cache."""
+    return Path(os.environ.get("LOCALAPPDATA") or Path.home()/".cache")/"exo"/"sysinfo.json"
+
 
 class WindowsSystemConfig:
     """Manages Windows system configuration for optimal performance."""
     
-    def __init__(self):
+    def __init__(self, use_cache: bool = True):
         self.is_windows = sys.platform.startswith("win32")
-        self.system_info = self._get_system_info()
-        self.gpu_info = self._detect_gpus()
+        cached = self._load_cached_info() if use_cache else None
+        if cached is not None:
+            self.system_info, self.gpu_info = cached
+            # Available memory is the one fact that changes between runs
+            self.system_info["available_memory_gb"] = psutil.virtual_memory().available / (1024**3)
+        else:
+            self.system_info = self._get_system_info()
+            self.gpu_info = self._detect_gpus()
+            if use_cache:
+                self._save_cached_info()
+        # Prime psutil's counters so later non-blocking reads are meaningful
+        self._cpu_pct = psutil.cpu_percent(interval=None)
+        self._cpu_sampler_task: Optional[asyncio.Task] = None
+    
+    def _load_cached_info(self) -> Optional[Tuple[Dict, List[Dict]]]:
+        """Load system and GPU info from disk if fresh and written by this version on this host."""
+        try:
+            with open(_sysinfo_cache_path(), "r") as f:
+                data = json.load(f)
+            # A timestamp from the future (clock skew, copied profile) is never fresh
+            age = time.time() - data.get("created_at", 0)
+            if data.get("version") != VERSION or not 0 <= age <= SYSINFO_CACHE_TTL:
+                return None
+            # The cache directory may be shared between machines (e.g. an NFS home)
+            if data.get("node") != platform.node() or data.get("platform") != sys.platform:
+                return None
+            return data["system_info"], data["gpu_info"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+    
+    def _save_cached_info(self):
+        """Persist system and GPU info for subsequent processes."""
+        path = _sysinfo_cache_path()
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump({
+                    "version": VERSION,
+                    "node": platform.node(),
+                    "platform": sys.platform,
+                    "created_at": time.time(),
+                    "system_info": self.system_info,
+                    "gpu_info": self.gpu_info,
+                }, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
         
     def _get_system_info(self) -> Dict:
         """Get comprehensive Windows system information."""
+        physical_cores, logical_cores = _cpu_counts()
+        vm = psutil.virtual_memory()
         return {
             "os": platform.system(),
             "version": platform.version(),
             "architecture": platform.machine(),
             "processor": platform.processor(),
-            "cpu_count": psutil.cpu_count(logical=False),
-            "cpu_count_logical": psutil.cpu_count(logical=True),
-            "total_memory_gb": psutil.virtual_memory().total / (1024**3),
-            "available_memory_gb": psutil.virtual_memory().available / (1024**3),
+            "cpu_count": physical_cores,
+            "cpu_count_logical": logical_cores,
+            "total_memory_gb": vm.total / (1024**3),
+            "available_memory_gb": vm.available / (1024**3),
         }
     
     def _detect_gpus(self) -> List[Dict]:
         """Detect available GPUs on Windows system."""
+        # Each probe is a subprocess with its own timeout; run them side by
+        # side so startup waits for the slowest one rather than their sum.
+        probes = (self._detect_nvidia_gpus, self._detect_amd_gpus, self._detect_intel_arc_gpus)
+        with ThreadPoolExecutor(max_workers=len(probes)) as executor:
+            results = executor.map(lambda probe: probe(), probes)
+            return [gpu for gpus in results for gpu in gpus]
+    
+    def _detect_nvidia_gpus(self) -> List[Dict]:
+        """Detect NVIDIA GPUs via nvidia-smi."""
         gpus = []
-        
-        # Check for NVIDIA GPUs
         try:
             result = subprocess.run(
                 ['nvidia-smi', '--query-gpu=name,memory.total', '--format=csv,noheader'],
@@ -44,18 +128,19 @@ class WindowsSystemConfig:
                 timeout=5
             )
             if result.returncode == 0:
-                for line in result.stdout.strip().split('\n'):
-                    if line:
-                        parts = line.split(',')
-                        gpus.append({
-                            'type': 'NVIDIA',
-                            'name': parts[0].strip(),
-                            'memory_mb': int(parts[1].strip().split()[0]) if len(parts) > 1 else 0
-                        })
+                for match in _NVIDIA_LINE.finditer(result.stdout):
+                    name, memory = match.groups()
+                    gpus.append({
+                        'type': 'NVIDIA',
+                        'name': name,
+                        'memory_mb': int(memory) if memory else 0
+                    })
         except Exception:
             pass
-        
-        # Check for AMD GPUs
+        return gpus
+    
+    def _detect_amd_gpus(self) -> List[Dict]:
+        """Detect AMD GPUs via amd-smi."""
         try:
             result = subprocess.run(
                 ['amd-smi', 'list', '--csv'],
@@ -64,15 +149,17 @@ class WindowsSystemConfig:
                 timeout=5
             )
             if result.returncode == 0:
-                gpus.append({
+                return [{
                     'type': 'AMD',
                     'name': 'AMD GPU',
                     'memory_mb': 0
-                })
+                }]
         except Exception:
             pass
-        
-        # Check for Intel Arc GPUs
+        return []
+    
+    def _detect_intel_arc_gpus(self) -> List[Dict]:
+        """Detect Intel Arc GPUs via WMI."""
         try:
             result = subprocess.run(
                 ['powershell', '-Command', 'Get-WmiObject Win32_VideoController | Select-Object Name'],
@@ -80,16 +167,15 @@ class WindowsSystemConfig:
                 text=True,
                 timeout=5
             )
-            if 'Arc' in result.stdout:
-                gpus.append({
+            if _INTEL_ARC.search(result.stdout):
+                return [{
                     'type': 'Intel Arc',
                     'name': 'Intel Arc GPU',
                     'memory_mb': 0
-                })
+                }]
         except Exception:
             pass
-        
-        return gpus
+        return []
     
     def optimize_network_settings(self):
         """Optimize Windows network settings for distributed inference."""
@@ -115,13 +201,36 @@ class WindowsSystemConfig:
         vm = psutil.virtual_memory()
         return vm.available, vm.total
     
+    def start_cpu_sampler(self, interval: float = CPU_SAMPLE_INTERVAL) -> asyncio.Task:
+        """Refresh the CPU usage reported by get_cpu_info in the background."""
+        if self._cpu_sampler_task is None or self._cpu_sampler_task.done():
+            self._cpu_sampler_task = asyncio.create_task(self._cpu_sampler(interval))
+        return self._cpu_sampler_task
+    
+    def stop_cpu_sampler(self):
+        """Stop the background CPU sampler; get_cpu_info then samples on demand."""
+        if self._cpu_sampler_task is not None:
+            self._cpu_sampler_task.cancel()
+            self._cpu_sampler_task = None
+    
+    async def _cpu_sampler(self, interval: float):
+        """Refresh the cached CPU usage every interval seconds until cancelled."""
+        while True:
+            await asyncio.sleep(interval)
+            self._cpu_pct = psutil.cpu_percent(interval=None)
+    
     def get_cpu_info(self) -> Dict:
-        """Get detailed CPU information."""
+        """Get detailed CPU information without blocking on a usage sample."""
+        if self._cpu_sampler_task is None or self._cpu_sampler_task.done():
+            # Usage since the previous call; never waits
+            self._cpu_pct = psutil.cpu_percent(interval=None)
+        physical_cores, logical_cores = _cpu_counts()
+        freq = psutil.cpu_freq()
         return {
-            'physical_cores': psutil.cpu_count(logical=False),
-            'logical_cores': psutil.cpu_count(logical=True),
-            'frequency_mhz': psutil.cpu_freq().current if psutil.cpu_freq() else 0,
-            'usage_percent': psutil.cpu_percent(interval=1),
+            'physical_cores': physical_cores,
+            'logical_cores': logical_cores,
+            'frequency_mhz': freq.current if freq else 0,
+            'usage_percent': self._cpu_pct,
         }
     
     def print_system_info(self):
@@ -151,7 +260,6 @@ class WindowsProcessOptimization:
     def set_process_priority(priority: str = "high"):
         """Set process priority for better performance."""
         try:
-            import psutil
             p = psutil.Process(os.getpid())
             
             priority_map = {
@@ -41,6 +41,7 @@ extras_require = {
   "windows": ["pywin32==308",],
   "nvidia-gpu": ["nvidia-ml-py==12.560.30",],
   "amd-gpu": ["pyrsmi==0.2.0"],
+  "fast-json": ["orjson==3.10.12"],
 }
 
 # Check if running on macOS with Apple Silicon